@@ -0,0 +1,72 @@
+"""ad_embeddings typed filter columns
+
+Adds the price/rooms/city columns that search_vectors filters on, backfills
+them from the metadata JSONB and builds their indexes. Every step is
+idempotent, so this also runs cleanly against a database created with
+create_tables() (which already has the columns).
+
+Skipped when ad_embeddings doesn't exist yet: DatabaseManager.create_tables()
+builds a fresh database with the current schema.
+
+Revision ID: a3f1c9d2e7b4
+Revises:
+Create Date: 2026-10-15 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f1c9d2e7b4'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_NUMBER = r"'^-?[0-9]+(\.[0-9]+)?$'"
+
+
+def upgrade() -> None:
+    op.execute(f"""
+        DO $$
+        BEGIN
+            IF to_regclass('ad_embeddings') IS NULL THEN
+                RETURN;
+            END IF;
+
+            ALTER TABLE ad_embeddings ADD COLUMN IF NOT EXISTS price numeric(12, 2);
+            ALTER TABLE ad_embeddings ADD COLUMN IF NOT EXISTS rooms numeric(4, 1);
+            ALTER TABLE ad_embeddings ADD COLUMN IF NOT EXISTS city varchar(100);
+
+            -- Same coercion as save_embeddings_batch: non-numeric values become NULL
+            UPDATE ad_embeddings SET
+                price = CASE WHEN metadata ->> 'price' ~ {_NUMBER}
+                    THEN (metadata ->> 'price')::numeric(12, 2) END,
+                rooms = CASE WHEN metadata ->> 'rooms' ~ {_NUMBER}
+                    THEN (metadata ->> 'rooms')::numeric(4, 1) END,
+                city = left(metadata ->> 'city', 100)
+            WHERE price IS NULL AND rooms IS NULL AND city IS NULL;
+
+            -- Earlier schemas used these names for expression indexes on the
+            -- metadata JSONB; replace them with the plain column indexes
+            DROP INDEX IF EXISTS ix_ad_embeddings_price;
+            DROP INDEX IF EXISTS ix_ad_embeddings_rooms;
+            CREATE INDEX ix_ad_embeddings_price ON ad_embeddings (price);
+            CREATE INDEX ix_ad_embeddings_rooms ON ad_embeddings (rooms);
+            CREATE INDEX IF NOT EXISTS ix_ad_embeddings_city ON ad_embeddings (city);
+            CREATE INDEX IF NOT EXISTS ix_ad_embeddings_city_price ON ad_embeddings (city, price);
+            ANALYZE ad_embeddings;
+        END $$
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ad_embeddings_city_price', table_name='ad_embeddings')
+    op.drop_index('ix_ad_embeddings_city', table_name='ad_embeddings')
+    op.drop_index('ix_ad_embeddings_rooms', table_name='ad_embeddings')
+    op.drop_index('ix_ad_embeddings_price', table_name='ad_embeddings')
+    op.drop_column('ad_embeddings', 'city')
+    op.drop_column('ad_embeddings', 'rooms')
+    op.drop_column('ad_embeddings', 'price')
@@ -0,0 +1,52 @@
+"""ad_embeddings unique ad_id
+
+save_embeddings_batch upserts with ON CONFLICT (ad_id), which needs a unique
+constraint on ad_id. Older databases allowed several embeddings per ad, so
+duplicates are removed first, keeping each ad's newest row.
+
+Skipped when ad_embeddings doesn't exist yet: DatabaseManager.create_tables()
+builds a fresh database with the current schema.
+
+Revision ID: b7d2e4a91c05
+Revises: a3f1c9d2e7b4
+Create Date: 2026-10-15 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e4a91c05'
+down_revision: Union[str, None] = 'a3f1c9d2e7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('ad_embeddings') IS NULL THEN
+                RETURN;
+            END IF;
+
+            DELETE FROM ad_embeddings older
+            USING ad_embeddings newer
+            WHERE older.ad_id = newer.ad_id
+                AND (coalesce(older.created_at, '-infinity'), older.id::text)
+                    < (coalesce(newer.created_at, '-infinity'), newer.id::text);
+
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint WHERE conname = 'ad_embeddings_ad_id_key'
+            ) THEN
+                ALTER TABLE ad_embeddings ADD CONSTRAINT ad_embeddings_ad_id_key UNIQUE (ad_id);
+            END IF;
+        END $$
+    """)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE ad_embeddings DROP CONSTRAINT IF EXISTS ad_embeddings_ad_id_key")
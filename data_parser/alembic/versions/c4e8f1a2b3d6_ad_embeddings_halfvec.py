@@ -0,0 +1,67 @@
+"""ad_embeddings halfvec storage and inner-product HNSW index
+
+Converts ad_embeddings.embedding from vector(1536) to halfvec(1536) (needs
+pgvector 0.7+), drops the earlier cosine HNSW index and builds the
+halfvec_ip_ops index that search_vectors' inner-product ordering uses.
+Stored OpenAI embeddings are already unit length, so inner product ranks
+them the same as cosine distance.
+
+Skipped when ad_embeddings doesn't exist yet: DatabaseManager.create_tables()
+builds a fresh database with the current schema.
+
+Revision ID: c4e8f1a2b3d6
+Revises: b7d2e4a91c05
+Create Date: 2026-10-15 23:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8f1a2b3d6'
+down_revision: Union[str, None] = 'b7d2e4a91c05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('ad_embeddings') IS NULL THEN
+                RETURN;
+            END IF;
+
+            -- Built for vector_cosine_ops / halfvec_cosine_ops; it would
+            -- block the type change and no query orders by cosine any more
+            DROP INDEX IF EXISTS ad_embeddings_embedding_hnsw_cos;
+
+            IF (
+                SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                WHERE attrelid = 'ad_embeddings'::regclass AND attname = 'embedding'
+            ) <> 'halfvec(1536)' THEN
+                ALTER TABLE ad_embeddings
+                    ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536);
+            END IF;
+
+            CREATE INDEX IF NOT EXISTS ad_embeddings_embedding_hnsw_ip
+                ON ad_embeddings USING hnsw (embedding halfvec_ip_ops)
+                WITH (m = 16, ef_construction = 64);
+        END $$
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ad_embeddings_embedding_hnsw_ip")
+    op.execute("""
+        ALTER TABLE ad_embeddings
+            ALTER COLUMN embedding TYPE vector(1536) USING embedding::vector(1536)
+    """)
+    op.execute("""
+        CREATE INDEX ad_embeddings_embedding_hnsw_cos
+            ON ad_embeddings USING hnsw (embedding vector_cosine_ops)
+            WITH (m = 16, ef_construction = 64)
+    """)
@@ -0,0 +1,44 @@
+"""ads.city and ad_embeddings (ad_id, context_hash) indexes
+
+ix_ads_city serves city lookups on ads; ix_ad_embeddings_ad_id_context_hash
+covers the missing-embedding anti-join and the context hash lookup.
+
+Skipped when the tables don't exist yet: DatabaseManager.create_tables()
+builds a fresh database with the current schema.
+
+Revision ID: d9a0b5c6e7f8
+Revises: c4e8f1a2b3d6
+Create Date: 2026-10-15 23:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a0b5c6e7f8'
+down_revision: Union[str, None] = 'c4e8f1a2b3d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        DO $$
+        BEGIN
+            IF to_regclass('ads') IS NOT NULL THEN
+                CREATE INDEX IF NOT EXISTS ix_ads_city ON ads (city);
+            END IF;
+            IF to_regclass('ad_embeddings') IS NOT NULL THEN
+                CREATE INDEX IF NOT EXISTS ix_ad_embeddings_ad_id_context_hash
+                    ON ad_embeddings (ad_id, context_hash);
+            END IF;
+        END $$
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_ad_embeddings_ad_id_context_hash")
+    op.execute("DROP INDEX IF EXISTS ix_ads_city")
@@ -5,8 +5,11 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Load environment variables once per process; the marker survives the module
+# being imported again under another name (e.g. src.config vs data_parser.src.config)
+if not os.getenv('_PARSER_DOTENV_LOADED'):
+    load_dotenv()
+    os.environ['_PARSER_DOTENV_LOADED'] = '1'
 
 class Config:
     """Parser configuration"""
@@ -16,4 +19,19 @@ class Config:
     ASYNC_DATABASE_URL = DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://')
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
+    # Connection pool shared by all DatabaseManager instances
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '20'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+
+    # Embedding batching (OpenAI accepts up to 2048 inputs per request)
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '256'))
+    EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', '4'))
+
+    # HNSW candidate list size per vector search (recall vs. latency)
+    HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '100'))
+    # Filters estimated to match less than this fraction of embeddings are
+    # searched exactly instead of through the HNSW index
+    EXACT_SEARCH_SELECTIVITY = float(os.getenv('EXACT_SEARCH_SELECTIVITY', '0.01'))
+
 config = Config()
@@ -1,20 +1,74 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, text
+from sqlalchemy import select, update, text, any_, exists, or_, bindparam
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql import func
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from decimal import Decimal, InvalidOperation
 import os
+import json
+import orjson
+import math
+import uuid
 import hashlib
-from .models import Base, Ad, AdHistory, AdEmbedding, Segment
+from functools import lru_cache
+from .models import Base, Ad, AdEmbedding, Segment
 from .config import config
 
+# One engine (and connection pool) per database URL, shared by every
+# DatabaseManager in the process
+_engines: Dict[str, AsyncEngine] = {}
+
+def get_engine(db_url: str) -> AsyncEngine:
+    """Return the process-wide engine for db_url, creating it on first use"""
+    if db_url not in _engines:
+        _engines[db_url] = create_async_engine(
+            db_url,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            # JIT planning stalls short OLTP queries for no benefit
+            connect_args={"server_settings": {"jit": "off"}}
+        )
+    return _engines[db_url]
+
+# Refreshes the filter columns of an existing embedding without touching the
+# vector. Rows that already match are left alone, since updating an indexed
+# column also writes a new HNSW index entry
+_embeddings = AdEmbedding.__table__
+_EMBEDDING_METADATA_UPDATE = update(_embeddings).where(
+    _embeddings.c.ad_id == bindparam('b_ad_id'),
+    or_(
+        _embeddings.c['metadata'].is_distinct_from(bindparam('b_metadata', type_=_embeddings.c['metadata'].type)),
+        _embeddings.c.price.is_distinct_from(bindparam('b_price', type_=_embeddings.c.price.type)),
+        _embeddings.c.rooms.is_distinct_from(bindparam('b_rooms', type_=_embeddings.c.rooms.type)),
+        _embeddings.c.city.is_distinct_from(bindparam('b_city', type_=_embeddings.c.city.type))
+    )
+).values({
+    _embeddings.c['metadata']: bindparam('b_metadata'),
+    _embeddings.c.price: bindparam('b_price'),
+    _embeddings.c.rooms: bindparam('b_rooms'),
+    _embeddings.c.city: bindparam('b_city')
+})
+
+def _to_decimal(value: Any) -> Optional[Decimal]:
+    """Coerce a scraped numeric value to Decimal, or None if it isn't one"""
+    if value is None or value == '':
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
 class DatabaseManager:
     def __init__(self, db_url: str = None):
         self.db_url = db_url or config.ASYNC_DATABASE_URL
-        self.engine = create_async_engine(self.db_url)
+        self.engine = get_engine(self.db_url)
+        # Writes go through Core statements and COPY, never the unit of work,
+        # so there is nothing for autoflush to do before each query
         self.Session = sessionmaker(
-            self.engine, class_=AsyncSession, expire_on_commit=False
+            self.engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
         )
 
     async def create_tables(self):
@@ -22,149 +76,355 @@ class DatabaseManager:
         async with self.engine.begin() as conn:
             await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
             await conn.run_sync(Base.metadata.create_all)
+            # create_all skips tables that already exist, so also create any
+            # model index they lack, notably the HNSW index. Databases older
+            # than the halfvec / filter columns need `alembic upgrade head` first
+            await conn.run_sync(self._create_missing_indexes)
+
+    @staticmethod
+    def _create_missing_indexes(sync_conn):
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(sync_conn, checkfirst=True)
+
+    async def analyze(self, *tables: str):
+        """Refresh planner statistics after a bulk load"""
+        async with self.engine.begin() as conn:
+            for table in tables:
+                await conn.execute(text(f"ANALYZE {table}"))
 
     async def create_segment(self, search_url: str, name: str, category: str) -> str:
         """Create a new segment or return existing one"""
         async with self.Session() as session:
             try:
-                # Check if exists
-                stmt = select(Segment).where(Segment.search_url == search_url)
+                # Single round-trip upsert; the no-op update on conflict makes
+                # RETURNING yield the existing row's id without renaming it
+                stmt = insert(Segment).values(
+                    search_url=search_url, name=name, category=category
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['search_url'],
+                    set_={'search_url': stmt.excluded.search_url}
+                ).returning(Segment.id)
                 result = await session.execute(stmt)
-                existing = result.scalar_one_or_none()
-                
-                if existing:
-                    return str(existing.id)
-                
-                # Create new
-                new_segment = Segment(search_url=search_url, name=name, category=category)
-                session.add(new_segment)
+                segment_id = result.scalar_one()
                 await session.commit()
-                return str(new_segment.id)
+                return str(segment_id)
             except Exception as e:
                 await session.rollback()
                 raise
 
+    # Columns staged via COPY (ads also get last_seen = now() on merge)
+    AD_COPY_COLUMNS = [
+        'id', 'segment_id', 'status', 'title', 'description', 'city',
+        'neighborhood', 'property_type', 'original_data'
+    ]
+    HISTORY_COPY_COLUMNS = [
+        'id', 'ad_id', 'price', 'rooms', 'square_meters', 'floor', 'attributes'
+    ]
+
     async def save_ads(self, ads_data: List[Dict[str, Any]], segment_id: str = None):
         """
         Upsert ads and insert history records.
+
+        Both tables are loaded with COPY: history rows go straight into
+        ad_history, ads are copied into a temp staging table and merged
+        with INSERT ... SELECT ... ON CONFLICT.
         """
+        segment_uuid = uuid.UUID(segment_id) if segment_id else None
+
+        # Last occurrence wins, as with the previous per-row upsert
+        ad_rows = {}
+        history_rows = []
+        for ad_data in ads_data:
+            ad_rows[ad_data['id']] = (
+                ad_data['id'],
+                segment_uuid,
+                'active',
+                ad_data['title'],
+                ad_data['description'],
+                ad_data['city'],
+                ad_data['neighborhood'],
+                ad_data['property_type'],
+                orjson.dumps(ad_data['original_data']).decode()
+            )
+            history_rows.append((
+                uuid.uuid4(),
+                ad_data['id'],
+                ad_data['price'],
+                ad_data['rooms'],
+                ad_data['square_meters'],
+                ad_data['floor'],
+                orjson.dumps(ad_data['attributes']).decode()
+            ))
+
+        if not ad_rows:
+            return
+
         async with self.Session() as session:
             try:
-                for ad_data in ads_data:
-                    await self._save_single_ad(session, ad_data, segment_id)
-                await session.commit()
+                conn = await session.connection()
+                raw_conn = (await conn.get_raw_connection()).driver_connection
+
+                # SQLAlchemy only begins a transaction when it executes a
+                # statement itself, so open one on the raw connection: the
+                # ON COMMIT DROP stage table must outlive the COPY, and the
+                # merge and history insert must land together
+                async with raw_conn.transaction():
+                    await raw_conn.execute(
+                        "CREATE TEMP TABLE ads_stage (LIKE ads INCLUDING DEFAULTS) ON COMMIT DROP"
+                    )
+                    await raw_conn.copy_records_to_table(
+                        'ads_stage', records=list(ad_rows.values()), columns=self.AD_COPY_COLUMNS
+                    )
+                    columns = ", ".join(self.AD_COPY_COLUMNS)
+                    await raw_conn.execute(f"""
+                        INSERT INTO ads ({columns}, last_seen)
+                        SELECT {columns}, now() FROM ads_stage
+                        ON CONFLICT (id) DO UPDATE SET
+                            last_seen = now(),
+                            title = EXCLUDED.title,
+                            description = EXCLUDED.description,
+                            original_data = EXCLUDED.original_data
+                    """)
+
+                    await raw_conn.copy_records_to_table(
+                        'ad_history', records=history_rows, columns=self.HISTORY_COPY_COLUMNS
+                    )
             except Exception as e:
                 await session.rollback()
                 print(f"Error saving ads batch: {e}")
                 raise
 
-    async def _save_single_ad(self, session: AsyncSession, ad_data: Dict[str, Any], segment_id: str):
-        # 1. Upsert Ad
-        stmt = insert(Ad).values(
-            id=ad_data['id'],
-            segment_id=segment_id,
-            title=ad_data['title'],
-            description=ad_data['description'],
-            city=ad_data['city'],
-            neighborhood=ad_data['neighborhood'],
-            property_type=ad_data['property_type'],
-            original_data=ad_data['original_data'],
-            last_seen=func.now()
-        ).on_conflict_do_update(
-            index_elements=['id'],
-            set_={
-                'last_seen': func.now(),
-                'title': ad_data['title'],
-                'description': ad_data['description'],
-                'original_data': ad_data['original_data']
-            }
-        )
-        await session.execute(stmt)
-
-        # 2. Insert History
-        history = AdHistory(
-            ad_id=ad_data['id'],
-            price=ad_data['price'],
-            rooms=ad_data['rooms'],
-            square_meters=ad_data['square_meters'],
-            floor=ad_data['floor'],
-            attributes=ad_data['attributes']
-        )
-        session.add(history)
-
-        # 3. Handle Embedding (Logic to be added later: check hash, generate if needed)
-        # For now, we just prepare the placeholder or check if we need to queue it
-        pass
-
     async def get_ads_without_embeddings(self, limit: int = 100):
         """Get ads that need embedding generation"""
         async with self.Session() as session:
             # Logic: Ads where context_hash doesn't match current content or no embedding exists
             # This is a simplified check
-            subquery = select(AdEmbedding.ad_id)
-            query = select(Ad).where(Ad.id.not_in(subquery)).limit(limit)
+            # NOT EXISTS plans as an anti-join on the ad_id index, unlike NOT IN
+            has_embedding = exists().where(AdEmbedding.ad_id == Ad.id)
+            query = select(Ad).where(~has_embedding).limit(limit)
             result = await session.execute(query)
             return result.scalars().all()
 
+    async def get_existing_hashes(self, ad_ids: List[str]) -> Dict[str, str]:
+        """Map ad_id -> stored context_hash for the given ads that already have embeddings"""
+        if not ad_ids:
+            return {}
+        async with self.Session() as session:
+            stmt = select(AdEmbedding.ad_id, AdEmbedding.context_hash).where(
+                AdEmbedding.ad_id == any_(ad_ids)
+            )
+            result = await session.execute(stmt)
+            return {ad_id: context_hash for ad_id, context_hash in result}
+
     async def save_embedding(self, ad_id: str, vector: List[float], context_hash: str, metadata: Dict):
+        await self.save_embeddings_batch([(ad_id, vector, context_hash, metadata)])
+
+    async def save_embeddings_batch(self, records: List[Tuple[str, List[float], str, Dict]]):
+        """
+        Upsert many embeddings in one transaction.
+
+        `records` are (ad_id, vector, context_hash, metadata) tuples. Rows are
+        COPYed into a temp staging table, with vectors in pgvector's text form
+        since asyncpg has no binary codec for them, then merged into
+        ad_embeddings with a single INSERT ... SELECT ... ON CONFLICT.
+        """
+        # Last occurrence of an ad wins
+        stage_rows = {
+            ad_id: (
+                uuid.uuid4(),
+                ad_id,
+                f"[{','.join(map(str, vector))}]",
+                context_hash,
+                orjson.dumps(metadata).decode(),
+                _to_decimal(metadata.get('price')),
+                _to_decimal(metadata.get('rooms')),
+                metadata.get('city')
+            )
+            for ad_id, vector, context_hash, metadata in records
+        }
+        if not stage_rows:
+            return
+
         async with self.Session() as session:
             try:
-                stmt = insert(AdEmbedding).values(
-                    ad_id=ad_id,
-                    embedding=vector,
-                    context_hash=context_hash,
-                    metadata=metadata
-                ).on_conflict_do_update(
-                    index_elements=['ad_id'],
-                    set_={
-                        'embedding': vector,
-                        'context_hash': context_hash,
-                        'metadata': metadata,
-                        'created_at': func.now()
-                    }
-                )
-                await session.execute(stmt)
+                conn = await session.connection()
+                raw_conn = (await conn.get_raw_connection()).driver_connection
+
+                # As in save_ads: the ON COMMIT DROP stage table needs an
+                # explicit transaction on the raw connection to survive the COPY
+                async with raw_conn.transaction():
+                    await raw_conn.execute("""
+                        CREATE TEMP TABLE ad_embeddings_stage (
+                            id uuid,
+                            ad_id varchar(50),
+                            embedding text,
+                            context_hash varchar(64),
+                            metadata jsonb,
+                            price numeric(12, 2),
+                            rooms numeric(4, 1),
+                            city varchar(100)
+                        ) ON COMMIT DROP
+                    """)
+                    await raw_conn.copy_records_to_table(
+                        'ad_embeddings_stage',
+                        records=list(stage_rows.values()),
+                        columns=[
+                            'id', 'ad_id', 'embedding', 'context_hash', 'metadata',
+                            'price', 'rooms', 'city'
+                        ]
+                    )
+                    await raw_conn.execute("""
+                        INSERT INTO ad_embeddings
+                            (id, ad_id, embedding, context_hash, metadata, price, rooms, city)
+                        SELECT id, ad_id, embedding::halfvec(1536), context_hash, metadata,
+                            price, rooms, city
+                        FROM ad_embeddings_stage
+                        ON CONFLICT (ad_id) DO UPDATE SET
+                            embedding = EXCLUDED.embedding,
+                            context_hash = EXCLUDED.context_hash,
+                            metadata = EXCLUDED.metadata,
+                            price = EXCLUDED.price,
+                            rooms = EXCLUDED.rooms,
+                            city = EXCLUDED.city,
+                            created_at = now()
+                    """)
+            except Exception as e:
+                await session.rollback()
+                print(f"Error saving embeddings batch: {e}")
+                raise
+
+    async def update_embedding_metadata(self, records: List[Tuple[str, Dict]]):
+        """
+        Refresh metadata and filter columns for ads whose embedding is kept.
+
+        `records` are (ad_id, metadata) tuples. Used for ads skipped by the
+        context hash check, whose price or rooms may still have changed.
+        """
+        if not records:
+            return
+        params = [
+            {
+                'b_ad_id': ad_id,
+                'b_metadata': metadata,
+                'b_price': _to_decimal(metadata.get('price')),
+                'b_rooms': _to_decimal(metadata.get('rooms')),
+                'b_city': metadata.get('city')
+            }
+            for ad_id, metadata in records
+        ]
+        async with self.Session() as session:
+            try:
+                await session.execute(_EMBEDDING_METADATA_UPDATE, params)
                 await session.commit()
             except Exception as e:
                 await session.rollback()
                 raise
 
+    @staticmethod
+    def _search_conditions(filters: Dict = None) -> list:
+        """Translate search filters into WHERE clauses on AdEmbedding"""
+        conditions = []
+        if not filters:
+            return conditions
+
+        # Typed copies of the metadata fields on AdEmbedding, so each
+        # comparison can use a plain B-tree index
+        if city := filters.get('city'):
+            conditions.append(AdEmbedding.city == city)
+        if min_price := filters.get('min_price'):
+            conditions.append(AdEmbedding.price >= min_price)
+        if max_price := filters.get('max_price'):
+            conditions.append(AdEmbedding.price <= max_price)
+        if min_rooms := filters.get('min_rooms'):
+            conditions.append(AdEmbedding.rooms >= min_rooms)
+        if max_rooms := filters.get('max_rooms'):
+            conditions.append(AdEmbedding.rooms <= max_rooms)
+        return conditions
+
+    async def _estimate_selectivity(self, session: AsyncSession, conditions: list) -> float:
+        """Planner-estimated fraction of ad_embeddings rows matching `conditions`"""
+        total = (await session.execute(text(
+            "SELECT reltuples FROM pg_class WHERE oid = 'ad_embeddings'::regclass"
+        ))).scalar()
+        if not total or total <= 0:
+            # Never analyzed: no basis for an estimate, keep the default plan
+            return 1.0
+
+        # Compile with ordinary bind parameters (not inlined literals) so the
+        # filter values never become SQL text; EXPLAIN still plans for them
+        compiled = select(AdEmbedding.id).where(*conditions).compile(dialect=self.engine.dialect)
+        params = compiled.construct_params()
+        conn = await session.connection()
+        plan = (await conn.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}",
+            tuple(params[name] for name in compiled.positiontup)
+        )).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return min(1.0, plan[0]['Plan']['Plan Rows'] / total)
+
     async def search_vectors(self, embedding: List[float], limit: int = 5, filters: Dict = None) -> List[Dict]:
         """Search for similar ads using vector similarity with optional filters"""
         async with self.Session() as session:
-            # Start building the query
-            stmt = select(AdEmbedding, Ad).join(Ad)
-            
-            # Apply Filters
-            if filters:
-                # Filter by City (on Ad table)
-                if city := filters.get('city'):
-                    stmt = stmt.where(Ad.city == city)
-                
-                # Filter by Metadata (on AdEmbedding table)
-                # Note: metadata_ is JSONB, so we cast to numeric for comparisons
-                if min_price := filters.get('min_price'):
-                    stmt = stmt.where(AdEmbedding.metadata_['price'].astext.cast(float) >= min_price)
-                if max_price := filters.get('max_price'):
-                    stmt = stmt.where(AdEmbedding.metadata_['price'].astext.cast(float) <= max_price)
-                if min_rooms := filters.get('min_rooms'):
-                    stmt = stmt.where(AdEmbedding.metadata_['rooms'].astext.cast(float) >= min_rooms)
-                if max_rooms := filters.get('max_rooms'):
-                    stmt = stmt.where(AdEmbedding.metadata_['rooms'].astext.cast(float) <= max_rooms)
-
-            # Order by Similarity (Cosine Distance)
-            stmt = stmt.order_by(AdEmbedding.embedding.cosine_distance(embedding)).limit(limit)
+            conditions = self._search_conditions(filters)
+
+            # HNSW applies WHERE clauses after the graph walk, so selective
+            # filters starve it of candidates. Settings below are SET LOCAL,
+            # scoped to this transaction so pooled connections keep defaults.
+            ef_search = max(config.HNSW_EF_SEARCH, limit)
+            if conditions:
+                selectivity = await self._estimate_selectivity(session, conditions)
+                if selectivity < config.EXACT_SEARCH_SELECTIVITY:
+                    # Few rows match: disabling plain index scans rules out
+                    # HNSW (it has no bitmap mode) while bitmap scans on the
+                    # attribute indexes stay available, so the plan becomes
+                    # attribute filter + exact top-N sort. This also applies
+                    # to the JOIN ads, which is intended: the few filtered
+                    # rows are joined with a parameterized bitmap scan on
+                    # ads_pkey, which costs the same as a plain index scan
+                    await session.execute(text("SET LOCAL enable_indexscan = off"))
+                    await session.execute(text("SET LOCAL enable_seqscan = on"))
+                else:
+                    # Widen the candidate list so enough rows survive the filter
+                    ef_search = max(ef_search, math.ceil(limit / selectivity))
+            await session.execute(text(f"SET LOCAL hnsw.ef_search = {min(int(ef_search), 1000)}"))
+
+            # Select only the columns the response needs; hydrating full rows
+            # would ship original_data and the embedding itself per match
+            # Embeddings are unit length, so negative inner product (<#>) ranks
+            # exactly like cosine distance without computing the norms
+            distance = AdEmbedding.embedding.max_inner_product(embedding).label('distance')
+            stmt = select(
+                Ad.id,
+                Ad.title,
+                Ad.description,
+                Ad.city,
+                AdEmbedding.price,
+                AdEmbedding.rooms,
+                distance
+            ).select_from(AdEmbedding).join(Ad).where(*conditions)
+
+            # Order by Similarity (Negative Inner Product); ordering by the label
+            # avoids binding the query vector a second time
+            stmt = stmt.order_by(distance).limit(limit)
             
             result = await session.execute(stmt)
             matches = []
-            for embedding_obj, ad_obj in result:
+            for row in result.mappings():
                 matches.append({
-                    "id": ad_obj.id,
-                    "title": ad_obj.title,
-                    "description": ad_obj.description,
-                    "price": float(embedding_obj.metadata_.get('price', 0)) if embedding_obj.metadata_ else 0,
-                    "city": ad_obj.city,
-                    "rooms": float(embedding_obj.metadata_.get('rooms', 0)) if embedding_obj.metadata_ else 0,
-                    "score": 0 
+                    "id": row['id'],
+                    "title": row['title'],
+                    "description": row['description'],
+                    "price": float(row['price'] or 0),
+                    "city": row['city'],
+                    "rooms": float(row['rooms'] or 0),
+                    "score": -row['distance']
                 })
             return matches
+
+@lru_cache(maxsize=1)
+def get_db_manager() -> DatabaseManager:
+    """Shared DatabaseManager for the default database URL"""
+    return DatabaseManager()
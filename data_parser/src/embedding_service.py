@@ -1,22 +1,86 @@
 import os
-from typing import List
+import asyncio
+from functools import lru_cache
+from typing import AsyncIterator, List, Optional, Tuple
+import httpx
+import numpy as np
+from blake3 import blake3
 from langchain_openai import OpenAIEmbeddings
 from .config import config
 
+def context_hash(text: str) -> str:
+    """Hex digest identifying an embedded text (fits AdEmbedding.context_hash)"""
+    return blake3(text.encode()).hexdigest()
+
+def normalize(vectors: List[List[float]]) -> List[List[float]]:
+    """Scale vectors to unit length so inner product equals cosine similarity"""
+    matrix = np.asarray(vectors, dtype=np.float64)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).tolist()
+
 class EmbeddingService:
     def __init__(self):
+        # Long-lived client so TLS connections are kept alive across calls
+        self.http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+        )
         self.embeddings = OpenAIEmbeddings(
             model="text-embedding-3-small",
-            openai_api_key=os.getenv("OPENAI_API_KEY")
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+            http_async_client=self.http_client
         )
 
     async def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for a single text"""
         # Clean text/add prefix if needed
         text = f"Hebrew Real Estate: {text}"
-        return await self.embeddings.aembed_query(text)
+        vector = await self.embeddings.aembed_query(text)
+        return normalize([vector])[0]
 
     async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a batch of texts"""
         prefixed_texts = [f"Hebrew Real Estate: {t}" for t in texts]
-        return await self.embeddings.aembed_documents(prefixed_texts)
+        vectors = await self.embeddings.aembed_documents(prefixed_texts)
+        return normalize(vectors) if vectors else vectors
+
+    async def iter_embedding_batches(
+        self, texts: List[str]
+    ) -> AsyncIterator[Tuple[int, List[Optional[List[float]]]]]:
+        """
+        Embed many texts in chunks of EMBEDDING_BATCH_SIZE, keeping up to
+        EMBEDDING_CONCURRENCY requests in flight.
+
+        Yields (offset, vectors) as each chunk completes, where offset is the
+        index in `texts` of the chunk's first entry. Requests for later
+        chunks keep running while the caller handles a yielded one. Vectors
+        of a chunk whose request failed are None.
+        """
+        batch_size = config.EMBEDDING_BATCH_SIZE
+        semaphore = asyncio.Semaphore(config.EMBEDDING_CONCURRENCY)
+
+        async def embed_chunk(offset: int) -> Tuple[int, List[Optional[List[float]]]]:
+            chunk = texts[offset:offset + batch_size]
+            async with semaphore:
+                try:
+                    return offset, await self.generate_embeddings_batch(chunk)
+                except Exception as e:
+                    print(f"⚠️ Failed to embed batch of {len(chunk)} texts: {e}")
+                    return offset, [None] * len(chunk)
+
+        tasks = [
+            asyncio.create_task(embed_chunk(offset))
+            for offset in range(0, len(texts), batch_size)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+@lru_cache(maxsize=1)
+def get_embedding_service() -> EmbeddingService:
+    """Shared EmbeddingService (and HTTP connection pool) for the process"""
+    return EmbeddingService()
@@ -1,7 +1,10 @@
-import json
+import orjson
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 
+_AMENITY_PREFIX = 'include'
+_AMENITY_PREFIX_LEN = len(_AMENITY_PREFIX)
+
 class JSONExtractor:
     def __init__(self, file_path: Path, metadata: Dict[str, Any] = None):
         self.file_path = file_path
@@ -15,10 +18,10 @@ class JSONExtractor:
             print(f"File not found: {self.file_path}")
             return []
 
-        with open(self.file_path, 'r', encoding='utf-8') as f:
+        with open(self.file_path, 'rb') as f:
             try:
-                data = json.load(f)
-            except json.JSONDecodeError as e:
+                data = orjson.loads(f.read())
+            except orjson.JSONDecodeError as e:
                 print(f"Error decoding JSON {self.file_path}: {e}")
                 return []
         
@@ -47,25 +50,22 @@ class JSONExtractor:
             property_type = details.get('property', {}).get('text', '')
             condition = details.get('propertyCondition', {}).get('text', '')
             
+            # Amenities: keys like 'includeParking' -> 'Parking'
+            amenities = [
+                k[_AMENITY_PREFIX_LEN:] if k.startswith(_AMENITY_PREFIX) else k
+                for k, v in item.get('inProperty', {}).items() if v
+            ]
+            city = self.metadata.get('city')
+            
             # Construct Context Document for Embedding
             # This document represents the semantic meaning of the ad
-            context_parts = [
+            context_doc = "\n".join(filter(None, (
+                f"City: {city}" if city else None,
                 f"Type: {property_type}",
                 f"Condition: {condition}",
-                f"Description: {search_text}"
-            ]
-            
-            # Add amenities
-            in_property = item.get('inProperty', {})
-            amenities = [k.replace('include', '') for k, v in in_property.items() if v]
-            if amenities:
-                context_parts.append(f"Amenities: {', '.join(amenities)}")
-            
-            # Add location context if available in metadata
-            if self.metadata.get('city'):
-                context_parts.insert(0, f"City: {self.metadata['city']}")
-                
-            context_doc = "\n".join(context_parts)
+                f"Description: {search_text}",
+                f"Amenities: {', '.join(amenities)}" if amenities else None
+            )))
             
             # Map to our internal schema
             return {
@@ -74,7 +74,7 @@ class JSONExtractor:
                 "title": search_text[:100] + "..." if len(search_text) > 100 else search_text,
                 "description": search_text,
                 "property_type": property_type,
-                "city": self.metadata.get('city'),
+                "city": city,
                 "neighborhood": self.metadata.get('neighborhood'), # Might be None
                 "original_data": item,
                 "context_document": context_doc,
@@ -1,11 +1,11 @@
 import argparse
 import asyncio
+import sys
 from pathlib import Path
 from src.extractors.json_extractor import JSONExtractor
-from src.database_manager import DatabaseManager
-from src.embedding_service import EmbeddingService
+from src.database_manager import get_db_manager
+from src.embedding_service import get_embedding_service, context_hash
 from src.config import config
-import hashlib
 
 async def process_file(file_path: Path, city: str = None):
     print(f"📂 Processing {file_path}...")
@@ -19,7 +19,7 @@ async def process_file(file_path: Path, city: str = None):
         return
 
     # 2. Save to SQL
-    db = DatabaseManager()
+    db = get_db_manager()
     # Ensure tables exist (if not using alembic for dev)
     # await db.create_tables() 
     
@@ -37,36 +37,53 @@ async def process_file(file_path: Path, city: str = None):
 
     # 3. Generate Embeddings (Path A)
     print("   🧠 Generating Embeddings...")
-    embed_service = EmbeddingService()
+    embed_service = get_embedding_service()
     
+    # Skip ads whose context document hasn't changed since the last embedding
+    hashes = {
+        ad['id']: context_hash(ad['context_document'])
+        for ad in ads
+    }
+    existing = await db.get_existing_hashes(list(hashes))
+    ads_to_embed = [ad for ad in ads if existing.get(ad['id']) != hashes[ad['id']]]
+    print(f"      {len(ads) - len(ads_to_embed)} ads unchanged, embedding {len(ads_to_embed)}")
+
+    # Price and rooms aren't part of the context document, so an unchanged
+    # hash doesn't mean unchanged filter values; refresh those without re-embedding
+    try:
+        await db.update_embedding_metadata([
+            (ad['id'], {"price": ad['price'], "rooms": ad['rooms'], "city": ad['city']})
+            for ad in ads if existing.get(ad['id']) == hashes[ad['id']]
+        ])
+    except Exception as e:
+        print(f"      ❌ Error refreshing metadata of unchanged ads: {e}")
+
+    # Each batch is saved while the requests for the next ones are in flight
+    texts = [ad['context_document'] for ad in ads_to_embed]
     count = 0
-    for ad in ads:
-        context_doc = ad['context_document']
-        # Calculate hash
-        doc_hash = hashlib.sha256(context_doc.encode()).hexdigest()
-        
-        # Check if we need to embed (optimization: check DB first)
-        # For this script, we'll just do it (or you can implement the check)
-        
+    async for offset, vectors in embed_service.iter_embedding_batches(texts):
+        batch = ads_to_embed[offset:offset + len(vectors)]
+        records = [
+            (
+                ad['id'],
+                vector,
+                hashes[ad['id']],
+                {"price": ad['price'], "rooms": ad['rooms'], "city": ad['city']}
+            )
+            for ad, vector in zip(batch, vectors) if vector is not None
+        ]
         try:
-            vector = await embed_service.generate_embedding(context_doc)
-            
-            metadata = {
-                "price": ad['price'],
-                "rooms": ad['rooms'],
-                "city": ad['city']
-            }
-            
-            await db.save_embedding(ad['id'], vector, doc_hash, metadata)
-            count += 1
-            if count % 10 == 0:
-                print(f"      Processed {count} embeddings...")
-                
+            await db.save_embeddings_batch(records)
+            count += len(records)
+            print(f"      Processed {count} embeddings...")
         except Exception as e:
-            print(f"      ❌ Error embedding ad {ad['id']}: {e}")
+            print(f"      ❌ Error saving batch of {len(records)} embeddings: {e}")
 
     print(f"   ✅ Generated {count} embeddings")
 
+    # Keep planner statistics fresh so filtered vector searches pick the right plan
+    await db.analyze("ads", "ad_embeddings")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Ingest Yad2 JSON data")
     parser.add_argument("file", help="Path to JSON file")
@@ -74,4 +91,8 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
+    # uvloop's faster socket handling helps both asyncpg and the OpenAI client
+    if sys.platform != 'win32':
+        import uvloop
+        uvloop.install()
     asyncio.run(process_file(Path(args.file), args.city))
@@ -2,9 +2,10 @@
 Main parser orchestrator
 """
 import asyncio
-import json
+import orjson
+import re
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from datetime import datetime
 import argparse
 import sys
@@ -12,77 +13,67 @@ import os
 
 # Fix imports to work with the module execution
 from .config import config
-from .database_manager import DatabaseManager
-from .embedding_service import EmbeddingService
+from .database_manager import get_db_manager
+from .embedding_service import get_embedding_service, context_hash
+
+# Anything but digits and the decimal point: currency sign, thousands
+# separators, spaces
+_NON_NUMERIC_RE = re.compile(r'[^\d.]')
+
+def _parse_price(price_raw: Any) -> int:
+    """Parse a scraped price such as '1,250,000 ₪' into an int (0 if missing)"""
+    if not price_raw:
+        return 0
+    if isinstance(price_raw, (int, float)):
+        return int(price_raw)
+    try:
+        return int(float(_NON_NUMERIC_RE.sub('', str(price_raw)) or 0))
+    except ValueError:
+        return 0
 
 class ParserOrchestrator:
     def __init__(self):
-        self.db_manager = DatabaseManager()
-        self.embed_service = EmbeddingService()
-
-    async def ingest_json_file(self, json_path: Path, segment_name: str, search_url: str):
-        """Ingest ads from a scraper JSON output file"""
-        print(f"📥 Ingesting JSON: {json_path}")
-        
-        if not json_path.exists():
-            print(f"❌ File not found: {json_path}")
-            return
+        self.db_manager = get_db_manager()
+        self.embed_service = get_embedding_service()
 
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        items = data.get('items', [])
-        if not items:
-            print("⚠️ No items found in JSON")
-            return
+    @staticmethod
+    def _load_ads(json_path: Path) -> List[Dict[str, Any]]:
+        """Decode a scraper JSON output file and normalize its items into ad rows"""
+        data = orjson.loads(json_path.read_bytes())
 
-        ads_to_save = []
-        
-        # Create segment if needed
-        category = 'real_estate' if 'real_estate' in str(json_path) else 'vehicles'
-        try:
-            segment_id = await self.db_manager.create_segment(search_url, segment_name, category)
-            print(f"Processing {len(items)} items for segment {segment_name} ({segment_id})")
-        except Exception as e:
-            print(f"❌ Failed to create/get segment: {e}")
-            return
-
-        for item in items:
+        ads = []
+        for item in data.get('items', []):
             ad_id = str(item.get('id') or item.get('token'))
             if not ad_id: continue
 
             # Extract attributes
-            price_raw = item.get('price')
-            price = 0
-            if price_raw:
-                try:
-                    price = int(str(price_raw).replace('₪', '').replace(',', '').strip())
-                except:
-                    pass
+            price = _parse_price(item.get('price'))
             
-            title = item.get('title_1') or item.get('title') or "No Title"
-            description = item.get('search_text') or ""
-            city = item.get('city_text') or item.get('city') or ""
-            neighborhood = item.get('neighborhood') or ""
+            get = item.get
+            title = get('title_1') or get('title') or "No Title"
+            description = get('search_text') or ""
+            city = get('city_text') or get('city') or ""
+            neighborhood = get('neighborhood') or ""
             
             # Property Type
-            prop_type = item.get('asset_type_text') or "unknown"
+            prop_type = get('asset_type_text') or "unknown"
 
             # Attributes
             rooms = 0
             sqm = 0
             floor = 0
             
-            if 'additionalDetails' in item:
+            details = get('additionalDetails')
+            if details is not None:
                 try:
-                    rooms = float(item['additionalDetails'].get('roomsCount') or 0)
-                    sqm = int(item['additionalDetails'].get('squareMeter') or 0)
-                    floor = int(item['additionalDetails'].get('floor') or 0)
+                    rooms = float(details.get('roomsCount') or 0)
+                    sqm = int(details.get('squareMeter') or 0)
+                    floor = int(details.get('floor') or 0)
                 except:
                     pass
             
             # Construct Ad Data
-            ad_data = {
+            ads.append({
                 'id': ad_id,
                 'title': title,
                 'description': description,
@@ -95,36 +86,99 @@ class ParserOrchestrator:
                 'floor': floor,
                 'attributes': item, # Store full JSON
                 'original_data': item
-            }
-            ads_to_save.append(ad_data)
+            })
+        return ads
+
+    @staticmethod
+    def _embedding_inputs(ads: List[Dict[str, Any]]) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Embedding text and its context hash per ad id"""
+        texts = {
+            ad['id']: f"{ad['title']} {ad['description']} {ad['city']} {ad['neighborhood']} {ad['property_type']} {ad['rooms']} rooms {ad['price']} NIS"
+            for ad in ads
+        }
+        hashes = {
+            ad_id: context_hash(text)
+            for ad_id, text in texts.items()
+        }
+        return texts, hashes
+
+    async def ingest_json_file(self, json_path: Path, segment_name: str, search_url: str):
+        """Ingest ads from a scraper JSON output file"""
+        print(f"📥 Ingesting JSON: {json_path}")
+        
+        if not json_path.exists():
+            print(f"❌ File not found: {json_path}")
+            return
+
+        # Decoding, normalizing and hashing are CPU-bound and this also runs
+        # inside the API server, so they go to a thread; only the DB and
+        # OpenAI awaits stay on the event loop
+        ads_to_save = await asyncio.to_thread(self._load_ads, json_path)
+        if not ads_to_save:
+            print("⚠️ No items found in JSON")
+            return
+        
+        # Create segment if needed
+        category = 'real_estate' if 'real_estate' in str(json_path) else 'vehicles'
+        try:
+            segment_id = await self.db_manager.create_segment(search_url, segment_name, category)
+            print(f"Processing {len(ads_to_save)} items for segment {segment_name} ({segment_id})")
+        except Exception as e:
+            print(f"❌ Failed to create/get segment: {e}")
+            return
 
         # Save to DB
-        if ads_to_save:
-            try:
-                await self.db_manager.save_ads(ads_to_save, segment_id)
-                print(f"✅ Saved {len(ads_to_save)} ads to database")
-                
-                # Generate Embeddings
-                print("Generating embeddings...")
-                for ad in ads_to_save:
-                    text_to_embed = f"{ad['title']} {ad['description']} {ad['city']} {ad['neighborhood']} {ad['property_type']} {ad['rooms']} rooms {ad['price']} NIS"
-                    try:
-                        vector = await self.embed_service.generate_embedding(text_to_embed)
-                        
-                        metadata = {
+        try:
+            await self.db_manager.save_ads(ads_to_save, segment_id)
+            print(f"✅ Saved {len(ads_to_save)} ads to database")
+            
+            # Generate Embeddings
+            print("Generating embeddings...")
+            texts, hashes = await asyncio.to_thread(self._embedding_inputs, ads_to_save)
+
+            # Only embed ads that are new or whose text changed
+            existing = await self.db_manager.get_existing_hashes(list(hashes))
+            ads_to_embed = [
+                ad for ad in ads_to_save if existing.get(ad['id']) != hashes[ad['id']]
+            ]
+            print(f"Skipping {len(ads_to_save) - len(ads_to_embed)} unchanged ads")
+
+            # Each batch is saved while the requests for the next ones are in flight
+            batches = self.embed_service.iter_embedding_batches(
+                [texts[ad['id']] for ad in ads_to_embed]
+            )
+            async for offset, vectors in batches:
+                batch = ads_to_embed[offset:offset + len(vectors)]
+                records = [
+                    (
+                        ad['id'],
+                        vector,
+                        hashes[ad['id']],
+                        {
                             'price': ad['price'],
                             'rooms': ad['rooms'],
                             'sqm': ad['square_meters'],
                             'city': ad['city']
                         }
-                        
-                        await self.db_manager.save_embedding(ad['id'], vector, "hash_placeholder", metadata)
-                    except Exception as e:
-                        print(f"⚠️ Failed to generate embedding for {ad['id']}: {e}")
-                        
-                print("✅ Embeddings generated")
-            except Exception as e:
-                print(f"❌ Failed to save ads: {e}")
+                    )
+                    for ad, vector in zip(batch, vectors) if vector is not None
+                ]
+                try:
+                    await self.db_manager.save_embeddings_batch(records)
+                except Exception as e:
+                    print(f"⚠️ Failed to save batch of {len(records)} embeddings: {e}")
+                    
+            print("✅ Embeddings generated")
+
+            # Keep planner statistics fresh so filtered vector searches pick the right plan
+            await self.db_manager.analyze("ads", "ad_embeddings")
+        except Exception as e:
+            print(f"❌ Failed to save ads: {e}")
+
+async def ingest_json(path: str, segment_name: str, search_url: str):
+    """Ingest a scraper JSON output file into the database"""
+    orchestrator = ParserOrchestrator()
+    await orchestrator.ingest_json_file(Path(path), segment_name, search_url)
 
 async def main_async():
     parser = argparse.ArgumentParser(description='Parse Yad2 scraped HTML files')
@@ -141,12 +195,15 @@ async def main_async():
     args = parser.parse_args()
     
     if args.ingest_json and args.db:
-        orchestrator = ParserOrchestrator()
-        await orchestrator.ingest_json_file(Path(args.ingest_json), args.segment_name, args.search_url)
+        await ingest_json(args.ingest_json, args.segment_name, args.search_url)
     else:
         print("Only --ingest-json with --db is currently supported in this fix.")
 
 def main():
+    # uvloop's faster socket handling helps both asyncpg and the OpenAI client
+    if sys.platform != 'win32':
+        import uvloop
+        uvloop.install()
     asyncio.run(main_async())
 
 if __name__ == '__main__':
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Text, Numeric, JSON
+from sqlalchemy import Column, String, Integer, Float, DateTime, ForeignKey, Text, Numeric, JSON, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
 import uuid
 
 Base = declarative_base()
@@ -30,7 +30,7 @@ class Ad(Base):
     # Static/Slow-changing attributes
     title = Column(Text)
     description = Column(Text)  # searchText
-    city = Column(String(100))
+    city = Column(String(100), index=True)
     neighborhood = Column(String(100))
     street = Column(String(100))
     property_type = Column(String(50))
@@ -64,17 +64,40 @@ class AdEmbedding(Base):
     __tablename__ = 'ad_embeddings'
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    ad_id = Column(String(50), ForeignKey('ads.id', ondelete='CASCADE'), nullable=False)
+    ad_id = Column(String(50), ForeignKey('ads.id', ondelete='CASCADE'), nullable=False, unique=True)
     
-    # Vector data (1536 dimensions for text-embedding-3-small)
-    embedding = Column(Vector(1536))
+    # Vector data (1536 dimensions for text-embedding-3-small), stored as
+    # FP16 to halve row size and HNSW index memory
+    embedding = Column(HALFVEC(1536))
     
     # Hash to detect changes in content and avoid re-embedding
     context_hash = Column(String(64))
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    # Metadata for filtering during vector search
+    # Filter columns for vector search, copied from metadata at save time
+    # so filters compare typed, indexable values instead of casting JSONB
+    price = Column(Numeric(12, 2), index=True)
+    rooms = Column(Numeric(4, 1), index=True)
+    city = Column(String(100), index=True)
+    
+    # Full metadata as saved, kept for display
     metadata_ = Column("metadata", JSONB)
 
     ad = relationship("Ad", back_populates="embedding")
+
+    __table_args__ = (
+        # ANN index for search_vectors; the op class must match the
+        # distance operator used there (max_inner_product -> halfvec_ip_ops)
+        Index(
+            'ad_embeddings_embedding_hnsw_ip',
+            'embedding',
+            postgresql_using='hnsw',
+            postgresql_with={'m': 16, 'ef_construction': 64},
+            postgresql_ops={'embedding': 'halfvec_ip_ops'}
+        ),
+        # Covers the missing-embedding anti-join and the context hash lookup
+        Index('ix_ad_embeddings_ad_id_context_hash', 'ad_id', 'context_hash'),
+        # Most common combined filter: city plus a price range
+        Index('ix_ad_embeddings_city_price', 'city', 'price'),
+    )
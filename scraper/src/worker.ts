@@ -0,0 +1,50 @@
+/** Long-lived scraper worker: reads jobs from stdin, one JSON object per line */
+import { createInterface } from 'node:readline';
+import { ScraperOrchestrator } from './services/ScraperOrchestrator.js';
+import { config } from './config.js';
+
+// Marks result lines on stdout so the Python service can tell them apart from logs
+const RESULT_PREFIX = '@@result ';
+
+interface WorkerJob {
+  id: string;
+  url: string;
+  maxPages?: number;
+  concurrency?: number;
+}
+
+async function runJob(job: WorkerJob) {
+  const orchestrator = new ScraperOrchestrator(config);
+  try {
+    const report = await orchestrator.run({
+      searchUrl: job.url,
+      skipExisting: true,
+      maxPages: job.maxPages,
+      concurrency: job.concurrency ?? 1,
+    });
+    console.log(RESULT_PREFIX + JSON.stringify({ id: job.id, report }));
+  } catch (error) {
+    console.error('❌ Error:', error);
+    console.log(RESULT_PREFIX + JSON.stringify({ id: job.id, error: String(error) }));
+  }
+}
+
+async function main() {
+  const lines = createInterface({ input: process.stdin, crlfDelay: Infinity });
+
+  // Jobs run one at a time, in the order they arrive
+  for await (const line of lines) {
+    if (!line.trim()) continue;
+
+    let job: WorkerJob;
+    try {
+      job = JSON.parse(line);
+    } catch {
+      console.error(`⚠️ Ignoring malformed job: ${line}`);
+      continue;
+    }
+    await runJob(job);
+  }
+}
+
+main();
@@ -8,13 +8,13 @@ from langchain_core.pydantic_v1 import BaseModel, Field
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../parser")))
 
 # from src.database_manager import DatabaseManager
-from data_parser.src.database_manager import DatabaseManager
-from data_parser.src.embedding_service import EmbeddingService
+from data_parser.src.database_manager import get_db_manager
+from data_parser.src.embedding_service import get_embedding_service
 from ..services.segment_manager import SegmentManager
 
 # Initialize services
-db = DatabaseManager()
-embed_service = EmbeddingService()
+db = get_db_manager()
+embed_service = get_embedding_service()
 segment_manager = SegmentManager(db)
 
 class SearchInput(BaseModel):
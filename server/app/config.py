@@ -1,24 +1,53 @@
 import os
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Load environment variables once per process; the marker survives the module
+# being imported again under another name (e.g. app.config vs server.app.config)
+if not os.getenv('_SERVER_DOTENV_LOADED'):
+    load_dotenv()
+    os.environ['_SERVER_DOTENV_LOADED'] = '1'
 
+@dataclass(frozen=True)
 class Config:
-    """Server configuration"""
+    """Server configuration, resolved once per process by get_config()"""
     
-    DATABASE_URL = os.getenv('DATABASE_URL', 'postgresql://localhost:5432/yad2_intelligence')
-    ASYNC_DATABASE_URL = DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://')
-    OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    DATABASE_URL: str
+    ASYNC_DATABASE_URL: str
+    OPENAI_API_KEY: Optional[str]
     
     # Path to scraper locations file
+    LOCATIONS_FILE: Path
+    LOCATIONS_FILE_EXISTS: bool
+    SCRAPER_DIR: Path
+    
+    # scraper/package.json script running the long-lived scraper worker
+    SCRAPER_WORKER_SCRIPT: str
+    
+    # Scrape + ingest jobs allowed to run at once
+    MAX_CONCURRENT_SCRAPES: int
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Read the environment and resolve paths once"""
+    database_url = os.getenv('DATABASE_URL', 'postgresql://localhost:5432/yad2_intelligence')
+    
     # Resolve relative to this file: server/app/config.py -> ../../scraper
-    _base_dir = Path(__file__).parent.parent.parent
-    LOCATIONS_FILE = Path(os.getenv('LOCATIONS_FILE', _base_dir / 'scraper/src/data/locations.json'))
-    SCRAPER_DIR = Path(os.getenv('SCRAPER_DIR', _base_dir / 'scraper'))
+    base_dir = Path(__file__).parent.parent.parent
+    locations_file = Path(os.getenv('LOCATIONS_FILE', base_dir / 'scraper/src/data/locations.json'))
     
-    # Scraper trigger command
-    SCRAPER_CMD = "npm run scrape"
+    return Config(
+        DATABASE_URL=database_url,
+        ASYNC_DATABASE_URL=database_url.replace('postgresql://', 'postgresql+asyncpg://'),
+        OPENAI_API_KEY=os.getenv('OPENAI_API_KEY'),
+        LOCATIONS_FILE=locations_file,
+        LOCATIONS_FILE_EXISTS=locations_file.exists(),
+        SCRAPER_DIR=Path(os.getenv('SCRAPER_DIR', base_dir / 'scraper')),
+        SCRAPER_WORKER_SCRIPT="worker",
+        MAX_CONCURRENT_SCRAPES=int(os.getenv('MAX_CONCURRENT_SCRAPES', '2'))
+    )
 
-config = Config()
+config = get_config()
@@ -1,9 +1,12 @@
+import asyncio
 import sys
 import os
 from fastapi import FastAPI
 from fastapi.responses import RedirectResponse
 from .api import routes
 from .config import config
+from .services.scraper_service import ScraperService
+from .services.scraper_worker import scraper_worker_pool
 
 # Add parser to path (hack for now)
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../parser")))
@@ -12,6 +15,30 @@ app = FastAPI(title="Yad2 Analyzer API")
 
 app.include_router(routes.router, prefix="/api/v1")
 
+@app.on_event("startup")
+async def start_scraper_worker():
+    # Start eagerly so the first scrape doesn't pay Node start-up; if this
+    # fails, submit() retries on demand
+    try:
+        await scraper_worker_pool.start()
+    except Exception as e:
+        print(f"⚠️ Could not start scraper worker: {e}")
+
+@app.on_event("startup")
+async def start_scrape_workers():
+    # Hold the tasks on app.state so they aren't garbage collected
+    scraper = ScraperService()
+    app.state.scrape_workers = {
+        asyncio.create_task(scraper.run_worker())
+        for _ in range(config.MAX_CONCURRENT_SCRAPES)
+    }
+
+@app.on_event("shutdown")
+async def stop_scraper_worker():
+    for task in app.state.scrape_workers:
+        task.cancel()
+    await scraper_worker_pool.stop()
+
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/docs")
@@ -22,4 +49,5 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
+    # loop="auto" (the default) picks uvloop when it is installed
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,103 +1,72 @@
 import asyncio
-import json
-import sys
+from data_parser.src import main as parser_main
 from ..config import config
+from .scraper_worker import log_buffer, logger, scraper_worker_pool
+
+# Pending scrape jobs ({"url", "segment_name"}), consumed by the fixed set of
+# ScraperService.run_worker() tasks started with the FastAPI app
+scrape_queue: asyncio.Queue = asyncio.Queue()
 
 class ScraperService:
     def __init__(self):
         self.scraper_dir = config.SCRAPER_DIR
-        self.cmd = config.SCRAPER_CMD
+        self.worker_pool = scraper_worker_pool
+
+    async def enqueue_scrape(self, url: str, segment_name: str):
+        """Queue a scrape + ingest of `url` for the background workers"""
+        await scrape_queue.put({"url": url, "segment_name": segment_name})
+
+    async def run_worker(self):
+        """
+        Consume scrape jobs forever. The app runs MAX_CONCURRENT_SCRAPES of
+        these, which bounds how many scrapes and parser runs (each holding DB
+        connections and OpenAI requests) are in flight at once.
+        """
+        while True:
+            job = await scrape_queue.get()
+            try:
+                await self.trigger_scrape(**job)
+            except Exception as e:
+                logger.error("❌ Scrape job failed for %s: %s", job["segment_name"], e)
+            finally:
+                scrape_queue.task_done()
 
     async def trigger_scrape(self, url: str, segment_name: str):
         """
-        Trigger the scraper for a specific URL in the background.
+        Scrape a specific URL and ingest the results.
         """
-        print(f"🚀 Triggering scraper for: {segment_name}")
-        
-        # We run this in a separate thread/process to not block the async loop
-        # Using asyncio.create_subprocess_exec is better for async apps
+        try:
+            await self._run(url, segment_name)
+        finally:
+            log_buffer.flush()
+
+    async def _run(self, url: str, segment_name: str):
+        logger.info("🚀 Triggering scraper for: %s", segment_name)
         
+        # The long-lived Node worker runs the scrape and streams its logs;
+        # we only wait for its report here
         try:
-            # Construct command: npm run scrape -- "url"
-            # Note: The extra -- is needed to pass args to the script in package.json
-            
-            # We need to split the command string "npm run scrape"
-            cmd_parts = self.cmd.split() 
-            args = cmd_parts + ["--", url]
-            
-            process = await asyncio.create_subprocess_exec(
-                *args,
-                cwd=self.scraper_dir,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            # Stream output in real-time
-            stdout_lines = []
-            stderr_lines = []
-            
-            async def log_stream(stream, prefix, collection):
-                while True:
-                    line = await stream.readline()
-                    if not line: break
-                    decoded = line.decode().strip()
-                    if decoded:
-                        print(f"[{prefix}] {decoded}")
-                        collection.append(decoded)
+            report = await self.worker_pool.submit(url)
+        except Exception as e:
+            logger.error("❌ Scraper failed for %s: %s", segment_name, e)
+            return
 
-            await asyncio.gather(
-                log_stream(process.stdout, "Scraper", stdout_lines),
-                log_stream(process.stderr, "Scraper ERR", stderr_lines)
-            )
-            
-            await process.wait()
-            
-            if process.returncode == 0:
-                print(f"✅ Scraper finished for {segment_name}")
+        logger.info("✅ Scraper finished for %s", segment_name)
+        
+        try:
+            if 'outputFile' in report:
+                output_file_rel = report['outputFile']
+                # Output is relative to scraper_dir (an absolute path is kept
+                # as-is); a lexical join is enough, no need to resolve symlinks
+                output_file_abs = self.scraper_dir.joinpath(output_file_rel)
                 
-                # Parse output to find the file
-                try:
-                    # Find the last non-empty line
-                    last_line = next((line for line in reversed(stdout_lines) if line.strip()), "")
-                    report = json.loads(last_line)
-                    
-                    if 'outputFile' in report:
-                        output_file_rel = report['outputFile']
-                        # Resolve to absolute path (output is relative to scraper_dir)
-                        output_file_abs = (self.scraper_dir / output_file_rel).resolve()
-                        
-                        print(f"📄 Output file: {output_file_abs}")
-                        
-                        # Trigger Parser
-                        print("🚀 Triggering parser ingestion...")
-                        
-                        parser_cmd = [
-                            sys.executable, "-m", "data_parser.src.main",
-                            "--ingest-json", str(output_file_abs),
-                            "--db",
-                            "--segment-name", segment_name,
-                            "--search-url", url
-                        ]
-                        
-                        parser_process = await asyncio.create_subprocess_exec(
-                            *parser_cmd,
-                            stdout=asyncio.subprocess.PIPE,
-                            stderr=asyncio.subprocess.PIPE
-                        )
-                        
-                        p_stdout, p_stderr = await parser_process.communicate()
-                        
-                        if parser_process.returncode == 0:
-                            print(f"✅ Parser finished successfully")
-                            print(p_stdout.decode())
-                        else:
-                            print(f"❌ Parser failed: {p_stderr.decode()}")
-                            
-                except Exception as e:
-                    print(f"❌ Failed to parse scraper output or trigger parser: {e}")
-
-            else:
-                print(f"❌ Scraper failed for {segment_name}. See logs above.")
+                logger.info("📄 Output file: %s", output_file_abs)
                 
+                # Run the parser in-process; it is async and shares this
+                # process's DB pool and embedding client
+                logger.info("🚀 Triggering parser ingestion...")
+                await parser_main.ingest_json(str(output_file_abs), segment_name, url)
+                logger.info("✅ Parser finished successfully")
+                    
         except Exception as e:
-            print(f"❌ Failed to launch scraper: {e}")
+            logger.error("❌ Failed to trigger parser: %s", e)
@@ -0,0 +1,204 @@
+import asyncio
+import itertools
+import logging
+import logging.handlers
+import orjson
+import os
+import shlex
+import subprocess
+from typing import Any, Dict, List, Optional
+from ..config import config
+
+# Bytes read from a subprocess pipe per await
+STREAM_CHUNK_SIZE = 65536
+
+# Must match RESULT_PREFIX in scraper/src/worker.ts
+RESULT_PREFIX = b"@@result "
+
+# Scraper logs are chatty; buffer them and write in batches of up to 200
+# lines. Warnings and errors flush straight away, and the buffer is flushed
+# whenever a job finishes or the worker exits
+logger = logging.getLogger("scraper")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(logging.Formatter("%(message)s"))
+log_buffer = logging.handlers.MemoryHandler(
+    capacity=200, flushLevel=logging.WARNING, target=_stream_handler
+)
+logger.addHandler(log_buffer)
+
+class ScraperWorkerPool:
+    """
+    Keeps a long-lived Node scraper worker (scraper/src/worker.ts) running
+    and feeds it jobs over stdin, so a scrape doesn't pay npm and Node
+    start-up each time.
+
+    Jobs are written as {"id", "url"} JSON lines. The worker runs them one
+    at a time and reports each on stdout as a RESULT_PREFIX line carrying
+    the same id; everything else it prints is forwarded as logs.
+    """
+
+    def __init__(self):
+        self.scraper_dir = config.SCRAPER_DIR
+        self.script = config.SCRAPER_WORKER_SCRIPT
+        self._argv: Optional[List[str]] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._stdin: Optional[asyncio.StreamWriter] = None
+        self._readers = []
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._job_ids = itertools.count(1)
+        self._start_lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        # The stdout reader ends as soon as the worker goes away, which can be
+        # before the process has been reaped and returncode set
+        return bool(self._readers) and not self._readers[0].done()
+
+    async def start(self):
+        """Launch the worker process unless it is already running"""
+        async with self._start_lock:
+            if self.running:
+                return
+
+            # Reap the previous worker (its stdout is closed, so it is useless
+            # even if it hasn't exited yet) and release its stdin pipe
+            if self._process is not None and self._process.poll() is None:
+                self._process.kill()
+                await asyncio.to_thread(self._process.wait)
+            if self._stdin is not None:
+                self._stdin.close()
+                self._stdin = None
+
+            logger.info("🚀 Starting scraper worker")
+            # fork() can stall the event loop for a noticeable time in a large
+            # process, so spawn from a thread and attach the pipes afterwards
+            process = await asyncio.to_thread(self._spawn)
+            loop = asyncio.get_running_loop()
+            try:
+                stdout = await self._connect_reader(loop, process.stdout)
+                stderr = await self._connect_reader(loop, process.stderr)
+                transport, protocol = await loop.connect_write_pipe(
+                    asyncio.streams.FlowControlMixin, process.stdin
+                )
+            except BaseException:
+                # Don't leave a worker running that nothing can talk to; the
+                # next submit() starts a fresh one
+                process.kill()
+                await asyncio.to_thread(process.wait)
+                for pipe in (process.stdin, process.stdout, process.stderr):
+                    pipe.close()
+                raise
+
+            self._process = process
+            self._stdin = asyncio.StreamWriter(transport, protocol, None, loop)
+            self._readers = [
+                asyncio.create_task(self._read_stream(stdout, "Scraper", logging.INFO, is_stdout=True)),
+                asyncio.create_task(self._read_stream(stderr, "Scraper ERR", logging.WARNING))
+            ]
+
+    def _spawn(self) -> subprocess.Popen:
+        # Run the package.json script directly rather than through `npm run`,
+        # which costs an extra npm process. Like npm, put the package's
+        # node_modules/.bin first on PATH
+        if self._argv is None:
+            package = orjson.loads((self.scraper_dir / "package.json").read_bytes())
+            self._argv = shlex.split(package['scripts'][self.script])
+
+        env = os.environ.copy()
+        env['PATH'] = os.pathsep.join((str(self.scraper_dir / "node_modules" / ".bin"), env.get('PATH', '')))
+
+        return subprocess.Popen(
+            self._argv,
+            cwd=self.scraper_dir,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+    @staticmethod
+    async def _connect_reader(loop, pipe) -> asyncio.StreamReader:
+        reader = asyncio.StreamReader(loop=loop)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe)
+        return reader
+
+    async def stop(self):
+        """Terminate the worker, failing any jobs still waiting on it"""
+        if self._stdin is not None:
+            self._stdin.close()
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                await asyncio.to_thread(self._process.wait, 10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        for reader in self._readers:
+            reader.cancel()
+        self._fail_pending("Scraper worker stopped")
+
+    async def submit(self, url: str) -> Dict[str, Any]:
+        """Queue a scrape of `url` and wait for the worker's report"""
+        await self.start()
+
+        job_id = str(next(self._job_ids))
+        result = asyncio.get_running_loop().create_future()
+        self._pending[job_id] = result
+
+        try:
+            self._stdin.write(orjson.dumps({"id": job_id, "url": url}) + b"\n")
+            await self._stdin.drain()
+        except Exception:
+            self._pending.pop(job_id, None)
+            raise
+        return await result
+
+    async def _read_stream(self, stream, prefix: str, level: int, is_stdout: bool = False):
+        def emit(line: bytes):
+            if line.startswith(RESULT_PREFIX):
+                self._resolve(line[len(RESULT_PREFIX):])
+                return
+            decoded = line.decode(errors='replace').strip()
+            if decoded:
+                logger.log(level, "[%s] %s", prefix, decoded)
+
+        # Drain the pipe in large chunks rather than one await per line
+        pending = b""
+        while True:
+            chunk = await stream.read(STREAM_CHUNK_SIZE)
+            if not chunk: break
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                emit(line)
+        emit(pending)
+        log_buffer.flush()
+
+        # stdout closing means the worker is gone; nothing will answer these
+        if is_stdout:
+            self._fail_pending("Scraper worker exited")
+
+    def _resolve(self, payload: bytes):
+        try:
+            message = orjson.loads(payload)
+        except orjson.JSONDecodeError as e:
+            logger.warning("⚠️ Malformed scraper worker result: %s", e)
+            return
+
+        log_buffer.flush()
+        result = self._pending.pop(message.get('id'), None)
+        if result is None or result.done():
+            return
+        if 'error' in message:
+            result.set_exception(RuntimeError(message['error']))
+        else:
+            result.set_result(message.get('report') or {})
+
+    def _fail_pending(self, reason: str):
+        pending, self._pending = self._pending, {}
+        for result in pending.values():
+            if not result.done():
+                result.set_exception(RuntimeError(reason))
+
+# Shared by every ScraperService; started and stopped with the FastAPI app
+scraper_worker_pool = ScraperWorkerPool()